@@ -1,7 +1,12 @@
 from django.contrib import admin
-from .models import *
+from django.contrib.admin.utils import lookup_spawns_duplicates
+from django.db.models import Q
+from django.utils.text import smart_split, unescape_string_literal
+from .models import Patient, PatientRecord, Traceability, Product, RawMaterial, RawMaterialQuantity
 from .forms import ProductForm
 
+SEARCH_PREFIXES = {"^": "istartswith", "=": "iexact", "@": "search"}
+
 
 class PatientRecordInline(admin.StackedInline):
     model = PatientRecord
@@ -11,21 +16,59 @@ class PatientRecordInline(admin.StackedInline):
 class RawMaterialQuantityInline(admin.StackedInline):
     model = RawMaterialQuantity
     extra = 0
+    autocomplete_fields = ("raw_material",)
 
 
 class PatientAdmin(admin.ModelAdmin):
     inlines = [PatientRecordInline]
     list_display = ("name", "cc", "product_name")
+    list_select_related = ("product_name",)
+    autocomplete_fields = ("product_name",)
     search_fields = ("name", "cc", "product_name__product_name")
+    list_per_page = 50
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Same as the default search, but products are matched through a subquery
+        # instead of one JOIN per search word.
+        search_fields = self.get_search_fields(request)
+        if not search_fields or not search_term:
+            return queryset, False
+        orm_lookups = [
+            f"{field[1:]}__{SEARCH_PREFIXES[field[0]]}" if field[0] in SEARCH_PREFIXES else f"{field}__icontains"
+            for field in search_fields if field != "product_name__product_name"]
+        search_products = "product_name__product_name" in search_fields
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            or_queries = Q(*((orm_lookup, bit) for orm_lookup in orm_lookups), _connector=Q.OR)
+            if search_products:
+                or_queries |= Q(product_name__in=Product.objects.filter(product_name__icontains=bit))
+            queryset = queryset.filter(or_queries)
+        may_have_duplicates = any(
+            lookup_spawns_duplicates(self.opts, orm_lookup) for orm_lookup in orm_lookups)
+        return queryset, may_have_duplicates
 
 
 class PatientRecordAdmin(admin.ModelAdmin):
     list_display = ("patient", "date")
+    list_select_related = ("patient",)
+    autocomplete_fields = ("patient",)
+    list_filter = ("requirement", "client")
+    date_hierarchy = "date"
+    list_per_page = 50
+    show_full_result_count = False
 
 
 class TraceabilityAdmin(admin.ModelAdmin):
     list_display = ("invoice_number", "purchase_date", "supplies")
-    search_fields = ("invoice_number", "supplies")
+    list_select_related = ("supplies",)
+    autocomplete_fields = ("supplies",)
+    search_fields = ("invoice_number", "supplies__raw_material_name")
+    list_filter = ("purchase_date",)
+    date_hierarchy = "purchase_date"
+    list_per_page = 50
+    show_full_result_count = False
 
 
 class ProductAdmin(admin.ModelAdmin):
@@ -42,10 +85,13 @@ class ProductAdmin(admin.ModelAdmin):
 
 class RawMaterialAdmin(admin.ModelAdmin):
     list_display = ("raw_material_name", )
+    search_fields = ("raw_material_name",)
 
 
 class RawMaterialQuantityAdmin(admin.ModelAdmin):
     list_display = ("product", "raw_material", "quantity")
+    list_select_related = ("product", "raw_material")
+    autocomplete_fields = ("product", "raw_material")
 
 
 admin.site.register(Patient, PatientAdmin)
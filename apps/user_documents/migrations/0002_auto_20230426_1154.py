@@ -9,14 +9,18 @@ class Migration(migrations.Migration):
         ('user_documents', '0001_initial'),
     ]
 
+    # 0001_initial already creates the table, so this only updates the migration state;
+    # creating it again failed on a fresh database.
     operations = [
-        migrations.CreateModel(
-            name='RawMaterialQuantity',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('quantity', models.CharField(max_length=10)),
-                ('product', models.ForeignKey(on_delete=models.deletion.CASCADE, to='user_documents.Product')),
-                ('raw_material', models.ForeignKey(on_delete=models.deletion.CASCADE, to='user_documents.RawMaterial')),
-            ],
-        ),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='RawMaterialQuantity',
+                fields=[
+                    ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                    ('quantity', models.CharField(max_length=10)),
+                    ('product', models.ForeignKey(on_delete=models.deletion.CASCADE, to='user_documents.Product')),
+                    ('raw_material', models.ForeignKey(on_delete=models.deletion.CASCADE, to='user_documents.RawMaterial')),
+                ],
+            ),
+        ]),
     ]
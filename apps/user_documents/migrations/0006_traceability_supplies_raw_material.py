@@ -0,0 +1,58 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def normalise(name):
+    return ' '.join(name.split())
+
+
+def link_supplies(apps, schema_editor):
+    RawMaterial = apps.get_model('user_documents', 'RawMaterial')
+    Traceability = apps.get_model('user_documents', 'Traceability')
+    # Match names regardless of case and spacing, as migrate_csv does, so variants of the
+    # same supply don't become separate raw materials.
+    raw_materials = {normalise(raw_material.raw_material_name).casefold(): raw_material
+                     for raw_material in RawMaterial.objects.all()}
+    names = {}
+    for name in Traceability.objects.values_list('supplies_name', flat=True).distinct():
+        names.setdefault(normalise(name).casefold(), []).append(name)
+    missing = [key for key in names if key not in raw_materials]
+    created = RawMaterial.objects.bulk_create(
+        RawMaterial(raw_material_name=normalise(names[key][0])) for key in missing)
+    raw_materials.update(zip(missing, created))
+    for key, variants in names.items():
+        Traceability.objects.filter(supplies_name__in=variants).update(supplies=raw_materials[key])
+
+
+def unlink_supplies(apps, schema_editor):
+    RawMaterial = apps.get_model('user_documents', 'RawMaterial')
+    Traceability = apps.get_model('user_documents', 'Traceability')
+    for raw_material in RawMaterial.objects.filter(traceability__isnull=False).distinct():
+        Traceability.objects.filter(supplies=raw_material).update(
+            supplies_name=raw_material.raw_material_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_documents', '0005_alter_product_subcategory'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='traceability',
+            old_name='supplies',
+            new_name='supplies_name',
+        ),
+        migrations.AlterField(
+            model_name='traceability',
+            name='supplies_name',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='traceability',
+            name='supplies',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='user_documents.rawmaterial'),
+        ),
+        migrations.RunPython(link_supplies, unlink_supplies),
+    ]
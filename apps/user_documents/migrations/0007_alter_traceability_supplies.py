@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_documents', '0006_traceability_supplies_raw_material'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='traceability',
+            name='supplies_name',
+        ),
+        migrations.AlterField(
+            model_name='traceability',
+            name='supplies',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='user_documents.rawmaterial'),
+        ),
+        migrations.AddIndex(
+            model_name='traceability',
+            index=models.Index(fields=['supplies', '-purchase_date'], name='traceability_supplies_date_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.6 on 2026-10-15 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_documents', '0007_alter_traceability_supplies'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patientrecord',
+            index=models.Index(fields=['patient', '-date'], name='pr_patient_date_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def parse_numbers(apps, schema_editor):
+    RawMaterialQuantity = apps.get_model('user_documents', 'RawMaterialQuantity')
+    Traceability = apps.get_model('user_documents', 'Traceability')
+    for quantity in RawMaterialQuantity.objects.all():
+        quantity.quantity_number = Decimal(quantity.quantity.strip().replace(',', '.'))
+        quantity.save(update_fields=['quantity_number'])
+    for traceability in Traceability.objects.all():
+        traceability.invoice_number_int = int(traceability.invoice_number.strip())
+        traceability.save(update_fields=['invoice_number_int'])
+
+
+def format_numbers(apps, schema_editor):
+    RawMaterialQuantity = apps.get_model('user_documents', 'RawMaterialQuantity')
+    Traceability = apps.get_model('user_documents', 'Traceability')
+    for quantity in RawMaterialQuantity.objects.all():
+        quantity.quantity = str(quantity.quantity_number.normalize())
+        quantity.save(update_fields=['quantity'])
+    for traceability in Traceability.objects.all():
+        traceability.invoice_number = str(traceability.invoice_number_int)
+        traceability.save(update_fields=['invoice_number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_documents', '0008_patientrecord_pr_patient_date_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rawmaterialquantity',
+            name='quantity',
+            field=models.CharField(max_length=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='traceability',
+            name='invoice_number',
+            field=models.CharField(max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='rawmaterialquantity',
+            name='quantity_number',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='traceability',
+            name='invoice_number_int',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(parse_numbers, format_numbers),
+    ]
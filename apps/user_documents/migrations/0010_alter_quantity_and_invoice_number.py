@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_documents', '0009_numeric_quantity_and_invoice_number'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='rawmaterialquantity',
+            name='quantity',
+        ),
+        migrations.RenameField(
+            model_name='rawmaterialquantity',
+            old_name='quantity_number',
+            new_name='quantity',
+        ),
+        migrations.AlterField(
+            model_name='rawmaterialquantity',
+            name='quantity',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.RemoveField(
+            model_name='traceability',
+            name='invoice_number',
+        ),
+        migrations.RenameField(
+            model_name='traceability',
+            old_name='invoice_number_int',
+            new_name='invoice_number',
+        ),
+        migrations.AlterField(
+            model_name='traceability',
+            name='invoice_number',
+            field=models.BigIntegerField(db_index=True),
+        ),
+    ]
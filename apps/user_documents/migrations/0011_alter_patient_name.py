@@ -0,0 +1,18 @@
+# Generated by Django 4.1.6 on 2026-10-15 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_documents', '0010_alter_quantity_and_invoice_number'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patient',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
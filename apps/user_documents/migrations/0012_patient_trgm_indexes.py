@@ -0,0 +1,25 @@
+# Generated by Django 4.1.6 on 2026-10-15 09:55
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_documents', '0011_alter_patient_name'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='patient_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('cc'), name='gin_trgm_ops'), name='patient_cc_trgm_idx'),
+        ),
+    ]
@@ -7,7 +7,9 @@ Classes:
 - PatientRecord: Represents a record of a patient's appointment in the database.
 """
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 
 YES = 'SI'
@@ -53,7 +55,7 @@ class Product(models.Model):
 class RawMaterialQuantity(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     raw_material = models.ForeignKey(RawMaterial, on_delete=models.CASCADE)
-    quantity = models.CharField(max_length=10)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
         return f"{self.quantity} {self.raw_material.raw_material_name} needed for {self.product.product_name}"
@@ -102,7 +104,7 @@ class Patient(models.Model):
         (PARTICULAR, 'Particular')
     ]
 
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     cc = models.CharField(max_length=10)
     address = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=10)
@@ -115,6 +117,15 @@ class Patient(models.Model):
         max_length=2, choices=YES_NO_CHOICES, default=NO)
     signature = models.ImageField(upload_to='signatures', null=True)
 
+    class Meta:
+        # Trigram indexes for the `icontains` search, which PostgreSQL runs as UPPER(...) LIKE.
+        indexes = [
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'),
+                     name='patient_name_trgm_idx'),
+            GinIndex(OpClass(Upper('cc'), name='gin_trgm_ops'),
+                     name='patient_cc_trgm_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -182,14 +193,20 @@ class PatientRecord(models.Model):
     new_appointment_date = models.DateTimeField(
         default=timezone.now, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-date'],
+                         name='pr_patient_date_idx'),
+        ]
+
     def __str__(self):
         return '{}'.format(self.date.strftime('%d/%m/%Y'))
 
 
 class Traceability(models.Model):
-    invoice_number = models.CharField(max_length=10)
+    invoice_number = models.BigIntegerField(db_index=True)
     purchase_date = models.DateField()
-    supplies = models.CharField(max_length=50)
+    supplies = models.ForeignKey(RawMaterial, on_delete=models.PROTECT)
     amount = models.FloatField()
     supplier = models.CharField(max_length=60)
     batch_number = models.CharField(max_length=30, blank=True)
@@ -197,5 +214,11 @@ class Traceability(models.Model):
     expiration_date = models.DateField(blank=True, null=True)
     value = models.IntegerField(null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['supplies', '-purchase_date'],
+                         name='traceability_supplies_date_idx'),
+        ]
+
     def __str__(self):
         return str(self.invoice_number)
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Patient, PatientRecord, Product, RawMaterial, RawMaterialQuantity, Traceability
+from .utils import invalidate_cache
+
+
+@receiver([post_save, post_delete], sender=Patient)
+@receiver([post_save, post_delete], sender=PatientRecord)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=RawMaterial)
+@receiver([post_save, post_delete], sender=Traceability)
+@receiver([post_save, post_delete], sender=RawMaterialQuantity)
+def clear_documents_cache(sender, **kwargs):
+    invalidate_cache()
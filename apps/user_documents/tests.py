@@ -1,3 +1,536 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import utils
+from .models import Patient, PatientRecord, Product, RawMaterial, RawMaterialQuantity, Traceability
+from .utils import (SPOOL_MAX_SIZE, CachedCountPaginator, _search_cache_key, get_cache_version, get_cached_pdfs,
+                    get_cached_queryset, get_materials, get_queryset, migrate_csv)
+
+
+def create_patient(name, product, cc='1', dates=()):
+    patient = Patient.objects.create(
+        name=name, cc=cc, address='Calle 1', phone_number='1', city='Cali', product_name=product)
+    for date in dates:
+        PatientRecord.objects.create(patient=patient, date=timezone.make_aware(date))
+    return patient
+
+
+class GetQuerysetTests(TestCase):
+    """Search parser used by the index page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = product = Product.objects.create(product_name='TRANSTIBIAL')
+        cls.ana = create_patient('ANA GOMEZ', product, cc='3456', dates=[
+            datetime.datetime(2021, 3, 5), datetime.datetime(2021, 3, 20)])
+        cls.bob = create_patient('BOB DIAZ', product, cc='2222', dates=[
+            datetime.datetime(2022, 11, 12)])
+
+    def search(self, query):
+        return list(get_queryset(query, Patient).order_by('name'))
+
+    def test_name_and_cc(self):
+        self.assertEqual(self.search('gomez'), [self.ana])
+        self.assertEqual(self.search('2222'), [self.bob])
+
+    def test_month_name(self):
+        self.assertEqual(self.search('March'), [self.ana])
+        self.assertEqual(self.search('nov'), [self.bob])
+
+    def test_year_range(self):
+        create_patient('CARL RUIZ', self.product, cc='7777', dates=[datetime.datetime(1850, 1, 1)])
+        self.assertEqual(self.search('2022'), [self.bob])
+        # Outside 1900-2100 a number is neither a year, a month nor a day.
+        self.assertEqual(self.search('1850'), [])
+        self.assertEqual(self.search('2222'), [self.bob])
+
+    def test_month_and_day_values(self):
+        # 1-2 digits are matched as a month (1-12) or a day (1-31).
+        self.assertEqual(self.search('11'), [self.bob])
+        self.assertEqual(self.search('20'), [self.ana])
+        self.assertEqual(self.search('05'), [self.ana])
+        self.assertEqual(self.search('32'), [])
+        self.assertEqual(self.search('012'), [])
+
+    def test_distinct_only_with_date_lookups(self):
+        self.assertFalse(get_queryset('gomez', Patient).query.distinct)
+        self.assertTrue(get_queryset('gomez 2021', Patient).query.distinct)
+        # Both of Ana's records are in March; she is returned once.
+        self.assertEqual(self.search('3'), [self.ana])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   DOCUMENTS_CACHING=True)
+class GetCachedQuerysetTests(TestCase):
+    """Search results cached until one of the models is saved or deleted."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(product_name='TRANSTIBIAL')
+        cls.ana = create_patient('ANA GOMEZ', cls.product, cc='3456')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        return list(get_cached_queryset(query, Patient).order_by('name'))
+
+    def test_cached_until_patient_saved(self):
+        self.assertEqual(self.search('gomez'), [self.ana])
+        # Only the primary key lookup; the search itself comes from the cache.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search('gomez'), [self.ana])
+
+        luis = create_patient('LUIS GOMEZ', self.product, cc='7890')
+        self.assertEqual(self.search('gomez'), [self.ana, luis])
+        luis.delete()
+        self.assertEqual(self.search('gomez'), [self.ana])
+
+    def test_cached_until_record_saved(self):
+        self.assertEqual(self.search('2021'), [])
+        PatientRecord.objects.create(patient=self.ana, date=timezone.make_aware(datetime.datetime(2021, 3, 5)))
+        self.assertEqual(self.search('2021'), [self.ana])
+
+    @override_settings(DOCUMENTS_CACHING=False)
+    def test_not_cached_without_shared_cache(self):
+        self.assertEqual(self.search('gomez'), [self.ana])
+        self.assertEqual(cache.get(_search_cache_key('search', 'gomez', Patient), version=get_cache_version()), None)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   DOCUMENTS_CACHING=True)
+class CachedCountPaginatorTests(TestCase):
+    """Patient count cached per search query until one of the models is saved."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(product_name='TRANSTIBIAL')
+        create_patient('ANA GOMEZ', cls.product, cc='3456')
+
+    def setUp(self):
+        cache.clear()
+
+    def count(self, query):
+        return CachedCountPaginator(get_queryset(query, Patient).order_by('name'), 10, query).count
+
+    def test_count_cached_until_patient_saved(self):
+        self.assertEqual(self.count(''), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(''), 1)
+        self.assertEqual(self.count('luis'), 0)
+
+        create_patient('LUIS GOMEZ', self.product, cc='7890')
+        self.assertEqual(self.count(''), 2)
+        self.assertEqual(self.count('luis'), 1)
+
+    @override_settings(DOCUMENTS_CACHING=False)
+    def test_plain_count_without_shared_cache(self):
+        self.assertEqual(self.count(''), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(''), 1)
+
+
+class GetMaterialsTests(TestCase):
+    """Latest purchase per supply before the patient's last record."""
+
+    def setUp(self):
+        self.foam = RawMaterial.objects.create(raw_material_name='FOAM')
+        self.resin = RawMaterial.objects.create(raw_material_name='RESINA')
+        self.product = Product.objects.create(product_name='TRANSTIBIAL')
+        RawMaterialQuantity.objects.create(product=self.product, raw_material=self.resin, quantity=1)
+        RawMaterialQuantity.objects.create(product=self.product, raw_material=self.foam, quantity=2)
+        self.patient = create_patient('ANA', self.product, dates=[datetime.datetime(2021, 6, 1)])
+        self.request = RequestFactory().get('/')
+        self.request._messages = CookieStorage(self.request)
+
+    def purchase(self, supplies, date, invoice_number):
+        return Traceability.objects.create(
+            invoice_number=invoice_number, purchase_date=date, supplies=supplies, amount=1, supplier='S')
+
+    def test_latest_purchase_before_last_record(self):
+        self.purchase(self.foam, datetime.date(2021, 1, 1), 1)
+        latest_foam = self.purchase(self.foam, datetime.date(2021, 5, 1), 2)
+        self.purchase(self.foam, datetime.date(2021, 7, 1), 3)
+        resin = self.purchase(self.resin, datetime.date(2020, 1, 1), 4)
+
+        materials = get_materials(self.request, self.patient, Traceability)
+
+        # One purchase per supply, in the order of the product's raw materials.
+        latest = {self.foam: latest_foam, self.resin: resin}
+        self.assertEqual(materials, [latest[raw_material] for raw_material in self.product.raw_materials.all()])
+        self.assertEqual(list(get_messages(self.request)), [])
+
+    def test_supply_without_previous_purchase(self):
+        foam = self.purchase(self.foam, datetime.date(2021, 5, 1), 1)
+        self.purchase(self.resin, datetime.date(2021, 7, 1), 2)
+
+        materials = get_materials(self.request, self.patient, Traceability)
+
+        self.assertEqual(materials, [foam])
+        self.assertEqual([str(message) for message in get_messages(self.request)],
+                         ['No se encontró ninguna fecha previa para el producto RESINA.'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   DOCUMENTS_CACHING=True)
+@mock.patch('apps.user_documents.utils.render_pdfs', side_effect=lambda *args: io.BytesIO(b'zip'))
+class GetCachedPdfsTests(TestCase):
+    """PDF archives cached per patient and records until the documents' models change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(product_name='TRANSTIBIAL')
+        cls.foam = RawMaterial.objects.create(raw_material_name='FOAM')
+        cls.ana = create_patient('ANA', cls.product)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_pdfs(self, indices=frozenset({0})):
+        context = {'request': RequestFactory().get('/'), 'selected_patient': self.ana, 'indices': indices}
+        return get_cached_pdfs(['follow-up.html'], context).read()
+
+    def test_cached_per_records(self, render_pdfs):
+        self.assertEqual(self.get_pdfs(), b'zip')
+        self.assertEqual(self.get_pdfs(), b'zip')
+        self.assertEqual(render_pdfs.call_count, 1)
+        self.get_pdfs(frozenset({0, 1}))
+        self.assertEqual(render_pdfs.call_count, 2)
+
+    def test_cached_until_product_or_raw_material_renamed(self, render_pdfs):
+        self.get_pdfs()
+        self.product.product_name = 'TRANSFEMORAL'
+        self.product.save()
+        self.get_pdfs()
+        self.assertEqual(render_pdfs.call_count, 2)
+        self.foam.raw_material_name = 'ESPUMA'
+        self.foam.save()
+        self.get_pdfs()
+        self.assertEqual(render_pdfs.call_count, 3)
+
+    def test_large_archive_not_cached(self, render_pdfs):
+        render_pdfs.side_effect = lambda *args: io.BytesIO(b'0' * (SPOOL_MAX_SIZE + 1))
+        self.assertEqual(len(self.get_pdfs()), SPOOL_MAX_SIZE + 1)
+        self.get_pdfs()
+        self.assertEqual(render_pdfs.call_count, 2)
+
+    @override_settings(DOCUMENTS_CACHING=False)
+    def test_not_cached_without_shared_cache(self, render_pdfs):
+        self.get_pdfs()
+        self.get_pdfs()
+        self.assertEqual(render_pdfs.call_count, 2)
+
+
+class PatientAdminSearchTests(TestCase):
+    """Admin changelist search over patient names, ids and products."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.transtibial = Product.objects.create(product_name='TRANSTIBIAL')
+        transfemoral = Product.objects.create(product_name='TRANSFEMORAL')
+        cls.juan = create_patient('JUAN PEREZ', cls.transtibial, cc='1234')
+        cls.perez = create_patient('PEREZ JUAN', transfemoral, cc='5678')
+
+    def search(self, search_term):
+        model_admin = admin.site._registry[Patient]
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            RequestFactory().get('/'), Patient.objects.order_by('name'), search_term)
+        self.assertFalse(may_have_duplicates)
+        return list(queryset)
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('juan perez'), [self.juan, self.perez])
+        self.assertEqual(self.search('juan 5678'), [self.perez])
+
+    def test_quoted_phrase(self):
+        self.assertEqual(self.search('"juan perez"'), [self.juan])
+
+    def test_product_name(self):
+        self.assertEqual(self.search('tibial'), [self.juan])
+        self.assertEqual(self.search('trans perez'), [self.juan, self.perez])
+        self.assertEqual(self.search('femoral juan'), [self.perez])
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrates to `migrate_from`, lets `setUpBeforeMigration` add rows, then migrates to `migrate_to`."""
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('user_documents', self.migrate_from)])
+        self.setUpBeforeMigration(executor.loader.project_state(
+            ('user_documents', self.migrate_from)).apps)
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('user_documents', self.migrate_to)])
+        self.apps = executor.loader.project_state(('user_documents', self.migrate_to)).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('user_documents'))
+
+    def setUpBeforeMigration(self, apps):
+        pass
+
+
+class LinkSuppliesMigrationTests(MigrationTestCase):
+    """0006 turns the Traceability.supplies names into RawMaterial foreign keys."""
+    migrate_from = '0005_alter_product_subcategory'
+    migrate_to = '0007_alter_traceability_supplies'
+
+    def setUpBeforeMigration(self, apps):
+        RawMaterial = apps.get_model('user_documents', 'RawMaterial')
+        Traceability = apps.get_model('user_documents', 'Traceability')
+        self.foam_pk = RawMaterial.objects.create(raw_material_name='FOAM').pk
+        supplies = (('1', 'FOAM'), ('2', 'foam '), ('3', 'Foam'), ('4', 'Resina  Epoxi'), ('5', 'RESINA EPOXI'))
+        for invoice_number, name in supplies:
+            Traceability.objects.create(invoice_number=invoice_number, purchase_date=datetime.date(2021, 1, 1),
+                                        supplies=name, amount=1, supplier='S')
+
+    def test_supplies_linked(self):
+        RawMaterial = self.apps.get_model('user_documents', 'RawMaterial')
+        Traceability = self.apps.get_model('user_documents', 'Traceability')
+        # Case and spacing variants share one raw material; new ones are created once.
+        self.assertEqual(sorted(RawMaterial.objects.values_list('raw_material_name', flat=True)),
+                         ['FOAM', 'Resina Epoxi'])
+        self.assertEqual(
+            dict(Traceability.objects.values_list('invoice_number', 'supplies__raw_material_name')),
+            {'1': 'FOAM', '2': 'FOAM', '3': 'FOAM', '4': 'Resina Epoxi', '5': 'Resina Epoxi'})
+        self.assertEqual(Traceability.objects.get(invoice_number='1').supplies_id, self.foam_pk)
+
+
+class ParseNumbersMigrationTests(MigrationTestCase):
+    """0009 converts the quantity and invoice number strings to numbers."""
+    migrate_from = '0008_patientrecord_pr_patient_date_idx'
+    migrate_to = '0010_alter_quantity_and_invoice_number'
+
+    def setUpBeforeMigration(self, apps):
+        RawMaterial = apps.get_model('user_documents', 'RawMaterial')
+        Product = apps.get_model('user_documents', 'Product')
+        RawMaterialQuantity = apps.get_model('user_documents', 'RawMaterialQuantity')
+        Traceability = apps.get_model('user_documents', 'Traceability')
+        foam = RawMaterial.objects.create(raw_material_name='FOAM')
+        product = Product.objects.create(product_name='TRANSTIBIAL')
+        RawMaterialQuantity.objects.create(product=product, raw_material=foam, quantity=' 1,5 ')
+        for invoice_number in (' 00123 ', '9999999999'):
+            Traceability.objects.create(invoice_number=invoice_number, purchase_date=datetime.date(2021, 1, 1),
+                                        supplies=foam, amount=1, supplier='S')
+
+    def test_numbers_parsed(self):
+        RawMaterialQuantity = self.apps.get_model('user_documents', 'RawMaterialQuantity')
+        Traceability = self.apps.get_model('user_documents', 'Traceability')
+        self.assertEqual(RawMaterialQuantity.objects.get().quantity, Decimal('1.5'))
+        # Leading zeros are lost; 10-digit invoices fit in the big integer column.
+        self.assertEqual(sorted(Traceability.objects.values_list('invoice_number', flat=True)),
+                         [123, 9999999999])
+
+
+class MigrateCsvTests(TestCase):
+    """Traceability import from the yearly CSV files."""
+    field_mapping = {
+        'invoice_number': 'FACTURA',
+        'purchase_date': 'FECHA',
+        'supplies': 'DETALLE',
+        'amount': 'CANTIDAD',
+        'supplier': 'PROVEEDOR',
+        'value': 'VALOR',
+    }
+
+    def migrate(self, rows):
+        with tempfile.TemporaryDirectory() as folder_path:
+            with open(os.path.join(folder_path, 'enero.csv'), 'w', encoding='latin-1') as csv_file:
+                csv_file.write('FACTURA;FECHA;DETALLE;CANTIDAD;PROVEEDOR;VALOR\n')
+                csv_file.writelines(';'.join(row) + '\n' for row in rows)
+            migrate_csv(folder_path, Traceability, self.field_mapping)
+
+    def test_supply_variants_share_a_raw_material(self):
+        RawMaterial.objects.create(raw_material_name='FOAM')
+        with self.assertLogs('apps.user_documents.utils', 'WARNING') as logs:
+            self.migrate([
+                ('1', '2021-01-02', ' foam ', '1', 'S', '1,000'),
+                ('2', '2021-01-03', 'Resina  Epoxi', '1', 'S', '2'),
+                ('3', '2021-01-04', 'RESINA EPOXI', '1', 'S', '3'),
+            ])
+        self.assertEqual(sorted(RawMaterial.objects.values_list('raw_material_name', flat=True)),
+                         ['FOAM', 'Resina Epoxi'])
+        self.assertEqual(list(Traceability.objects.order_by('invoice_number').values_list(
+            'invoice_number', 'supplies__raw_material_name', 'value')),
+            [(1, 'FOAM', 1000), (2, 'Resina Epoxi', 2), (3, 'Resina Epoxi', 3)])
+        self.assertIn('Resina Epoxi', logs.output[0])
+
+    def test_rows_without_supply_are_skipped(self):
+        with self.assertLogs('apps.user_documents.utils', 'WARNING') as logs:
+            self.migrate([
+                ('1', '2021-01-02', 'FOAM', '1', 'S', '1'),
+                ('2', '2021-01-03', '', '1', 'S', '2'),
+            ])
+        self.assertEqual(list(Traceability.objects.values_list('invoice_number', flat=True)), [1])
+        self.assertIn('enero.csv: 3', logs.output[-1])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   DOCUMENTS_CACHING=False, PDF_BACKGROUND_RENDERING=False)
+class IndexPageViewTests(TestCase):
+    """Parameters sent by the patient forms on the index page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(product_name='TRANSTIBIAL')
+        cls.ana = create_patient('ANA', product, dates=[
+            datetime.datetime(2021, 3, 5), datetime.datetime(2021, 4, 5)])
+
+    def get(self, query):
+        return self.client.get('/user_documents/?' + query)
+
+    def test_view_selected_records(self):
+        response = self.get('ANA=1&ANA=follow_up&ANA=1&ANA=&action=view')
+        self.assertEqual(response.context['selected_patient'], self.ana)
+        self.assertEqual(response.context['indices'], frozenset({1}))
+        self.assertTrue(response.context['follow_up'])
+        self.assertFalse(response.context['traceability'])
+
+    def test_non_decimal_digits_are_ignored(self):
+        response = self.get('ANA=%C2%B2&ANA=&action=view')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['indices'], frozenset())
+
+    def test_hidden_marker_selects_patient(self):
+        response = self.get('ANA=&action=view')
+        self.assertEqual(response.context['selected_patient'], self.ana)
+        self.assertEqual(response.context['indices'], frozenset())
+
+    def test_page_and_search_keys_are_not_patients(self):
+        create_patient('page', self.ana.product_name)
+        response = self.get('page=1&q=ana')
+        self.assertNotIn('selected_patient', response.context)
+        response = self.get('page=1&ANA=0&ANA=&action=view')
+        self.assertEqual(response.context['selected_patient'], self.ana)
+
+    @mock.patch('apps.user_documents.utils.pdfkit.from_string', return_value=b'%PDF')
+    def test_pdf_action_downloads_zip(self, from_string):
+        response = self.get('ANA=0&ANA=follow_up&ANA=&action=pdf')
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(from_string.call_count, 2)
+
+    def test_view_action_renders_page(self):
+        response = self.get('ANA=0&ANA=&action=view')
+        self.assertTemplateUsed(response, 'index.html')
+
+
+class QueuedExecutor:
+    """Stands in for the PDF job executor; runs the submitted jobs when told to."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+
+    def run(self):
+        for fn, args in self.jobs:
+            fn(*args)
+        self.jobs = []
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   DOCUMENTS_CACHING=True, PDF_BACKGROUND_RENDERING=True)
+@mock.patch('apps.user_documents.utils.pdfkit.from_string', return_value=b'%PDF')
+class PdfJobTests(TestCase):
+    """PDF archives rendered by the background job queue."""
+
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(product_name='TRANSTIBIAL')
+        create_patient('ANA', product, dates=[datetime.datetime(2021, 3, 5)])
+
+    def setUp(self):
+        cache.clear()
+        self.executor = QueuedExecutor()
+        for name, value in (('_pdf_executor', self.executor),
+                            ('_pdf_job_slots', threading.BoundedSemaphore(2)),
+                            # Jobs run in this thread; closing its connection would end the test transaction.
+                            ('connection', mock.Mock())):
+            patcher = mock.patch(f'apps.user_documents.utils.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertFreeSlots(self, count):
+        slots = [utils._pdf_job_slots.acquire(blocking=False) for _ in range(count + 1)]
+        self.assertEqual(slots, [True] * count + [False])
+
+    def start(self):
+        response = self.client.get('/user_documents/?ANA=0&ANA=&action=pdf')
+        self.assertEqual(response.status_code, 302)
+        return response.url
+
+    def test_pending_then_ready(self, from_string):
+        url = self.start()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Refresh'], '2')
+
+        self.executor.run()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertFreeSlots(2)
+
+    def test_deadline_counts_from_job_start(self, from_string):
+        url = self.start()
+        job_id = url.rstrip('/').rsplit('/', 1)[-1]
+        queued_at = time.time()
+        with mock.patch('apps.user_documents.utils.time.time', return_value=queued_at + utils.PDF_JOB_DEADLINE + 1):
+            # Waiting behind other jobs does not count against the render deadline.
+            self.assertEqual(self.client.get(url).status_code, 202)
+        with mock.patch('apps.user_documents.utils.time.time', return_value=queued_at + utils.PDF_JOB_QUEUE_DEADLINE + 1):
+            self.assertEqual(self.client.get(url).status_code, 500)
+
+        def render(*args):
+            started_at = time.time()
+            self.assertEqual(utils.get_pdf_job(job_id), utils.PDF_JOB_PENDING)
+            with mock.patch('apps.user_documents.utils.time.time', return_value=started_at + utils.PDF_JOB_DEADLINE + 1):
+                self.assertEqual(utils.get_pdf_job(job_id), utils.PDF_JOB_FAILED)
+            return io.BytesIO(b'zip')
+
+        with mock.patch('apps.user_documents.utils.get_cached_pdfs', side_effect=render) as get_cached_pdfs:
+            self.executor.run()
+        get_cached_pdfs.assert_called_once()
+        self.assertEqual(utils.get_pdf_job(job_id), b'zip')
+
+    def test_failed_and_unknown_jobs(self, from_string):
+        from_string.side_effect = OSError('wkhtmltopdf')
+        url = self.start()
+        with self.assertLogs('apps.user_documents.utils', 'ERROR'):
+            self.executor.run()
+        self.assertEqual(self.client.get(url).status_code, 500)
+        self.assertEqual(self.client.get('/user_documents/pdf/unknown/').status_code, 404)
+
+    def test_full_queue_renders_in_request(self, from_string):
+        self.start()
+        self.start()
+        response = self.client.get('/user_documents/?ANA=0&ANA=&action=pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+
+    def test_slot_released_when_submit_fails(self, from_string):
+        with mock.patch.object(self.executor, 'submit', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                utils.start_pdf_job(['follow-up.html'], {})
+        self.assertFreeSlots(2)
@@ -5,4 +5,5 @@ app_name = 'user_documents'
 
 urlpatterns = [
     path("", views.IndexPageView.as_view(), name="index"),
+    path("pdf/<str:job_id>/", views.PdfJobView.as_view(), name="pdf_job"),
 ]
@@ -1,63 +1,231 @@
+import hashlib
+import io
+import logging
+import operator
 import pdfkit
 import os
-import zipfile
 import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
 import pyodbc
 import pandas as pd
-from datetime import datetime
 from typing import Type, Dict
+from django.conf import settings
 from django.template.loader import get_template
-from django.http import HttpResponse
-from django.db.models import Q, Model
+from django.http import FileResponse
+from django.db import connection, transaction
+from django.db.models import Q, Model, OuterRef, Subquery, prefetch_related_objects
 from django.contrib import messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+MONTHS = [('Jan', 'January', 'jan'), ('Feb', 'February', 'feb'), ('Mar', 'March', 'mar'), ('Apr', 'April', 'apr'), ('May', 'May', 'may'), ('Jun', 'June', 'jun'),
+          ('Jul', 'July', 'jul'), ('Aug', 'August', 'aug'), ('Sep', 'Sept', 'September', 'sep', 'sept'), ('Oct', 'October', 'oct'), ('Nov', 'November', 'nov'), ('Dec', 'December', 'dec')]
+MONTH_MAP = {name.lower(): i + 1 for i, names in enumerate(MONTHS) for name in names}
+STRING_FILTERS = ('name__icontains', 'cc__icontains')
+YEAR_FILTER = 'patientrecord__date__year__in'
+MONTH_FILTER = 'patientrecord__date__month__in'
+DAY_FILTER = 'patientrecord__date__day__in'
+CACHE_VERSION_KEY = 'user_documents:version'
+SEARCH_CACHE_TIMEOUT = 60
+PDF_CACHE_TIMEOUT = 300
+ZIP_NAME = 'pdfs.zip'
+SPOOL_MAX_SIZE = 1 << 20
+PDF_JOB_TIMEOUT = 600
+PDF_JOB_WORKERS = 2
+PDF_JOB_DEADLINE = 120
+PDF_JOB_QUEUE_SIZE = 8
+PDF_JOB_QUEUE_DEADLINE = PDF_JOB_DEADLINE * PDF_JOB_QUEUE_SIZE // PDF_JOB_WORKERS
+PDF_JOB_PENDING = 'pending'
+PDF_JOB_FAILED = 'failed'
+
+logger = logging.getLogger(__name__)
+_pdf_executor = ThreadPoolExecutor(max_workers=PDF_JOB_WORKERS, thread_name_prefix='pdf-job')
+_pdf_job_slots = threading.BoundedSemaphore(PDF_JOB_QUEUE_SIZE)
+
+
+def render_pdfs(template_paths, context):
+    """
+    Render HTML templates to PDF files and pack them into a ZIP archive.
 
+    Args:
+        template_paths (list): List of file paths that contain HTML templates.
+        context (dict): Dictionary containing context data for rendering the templates.
 
-def download_pdfs(template_paths, context):
+    Returns:
+        SpooledTemporaryFile: The ZIP archive containing one PDF per template, positioned at
+        its start. It stays in memory up to 1 MiB and spills to disk beyond that.
     """
-    Download PDF files generated from HTML templates as a ZIP file.
+    options = {
+        'enable-local-file-access': None,
+        'page-size': 'B4',
+        'encoding': 'UTF-8',
+        'margin-top': '0',
+        'margin-bottom': '0',
+    }
+    archive = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+    # Templates may hit the database, so render them here; only the
+    # wkhtmltopdf subprocesses run on the worker threads.
+    max_workers = max(1, min(len(template_paths), os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for template_path in template_paths:
+            # Compiled templates are reused by Django's cached template loader.
+            template = get_template(template_path)
+            html = template.render(context)
+            template_name = os.path.splitext(template_path)[0] + ".pdf"
+            futures.append((template_name, executor.submit(
+                pdfkit.from_string, html, False, options=options)))
+
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for template_name, future in futures:
+                zip_file.writestr(template_name, future.result())
+
+    archive.seek(0)
+    return archive
+
+
+def get_cached_pdfs(template_paths, context, timeout=PDF_CACHE_TIMEOUT):
+    """
+    Return the ZIP archive of PDF files generated from HTML templates, reusing a cached copy.
+
+    The archive is cached for `timeout` seconds, keyed by the templates, the selected
+    patient, the selected record indices and the requesting host. Saving any of the
+    models the documents read invalidates it. Without `DOCUMENTS_CACHING` the archive is
+    rendered on every call.
 
     Args:
         template_paths (list): List of file paths that contain HTML templates.
         context (dict): Dictionary containing context data for rendering the templates.
+        timeout (int, optional): Seconds to keep the cached archive. Default, 300.
+
+    Returns:
+        A file object with the ZIP archive, positioned at its start.
+    """
+    if not settings.DOCUMENTS_CACHING:
+        return render_pdfs(template_paths, context)
+    patient = context.get('selected_patient')
+    request = context.get('request')
+    key_parts = (
+        tuple(template_paths),
+        patient.pk if patient else None,
+        tuple(sorted(context.get('indices', ()))),
+        request.get_host() if request else None,
+    )
+    key = 'user_documents:pdf:' + hashlib.sha1(repr(key_parts).encode()).hexdigest()
+    version = get_cache_version()
+    body = cache.get(key, version=version)
+    if body is not None:
+        return io.BytesIO(body)
+    archive = render_pdfs(template_paths, context)
+    # Only archives that still fit in memory are cached; larger ones are just streamed.
+    if archive.seek(0, os.SEEK_END) <= SPOOL_MAX_SIZE:
+        archive.seek(0)
+        cache.set(key, archive.read(), timeout, version=version)
+    archive.seek(0)
+    return archive
+
+
+def download_cached_pdfs(template_paths, context, timeout=PDF_CACHE_TIMEOUT):
+    """
+    Download PDF files generated from HTML templates as a ZIP file, reusing a cached archive.
+
+    Args:
+        template_paths (list): List of file paths that contain HTML templates.
+        context (dict): Dictionary containing context data for rendering the templates.
+        timeout (int, optional): Seconds to keep the cached archive. Default, 300.
 
     Returns:
         An HTTP response containing a ZIP file containing the generated PDFs.
     """
-    print(template_paths)
-    zip_name = 'pdfs.zip'
-    zip_file = zipfile.ZipFile(zip_name, 'w')
+    return zip_response(get_cached_pdfs(template_paths, context, timeout))
 
-    with tempfile.TemporaryDirectory() as temp_dir:
 
-        for template_path in template_paths:
-            template = get_template(template_path)
-            html = template.render(context)
-            options = {
-                'enable-local-file-access': None,
-                'page-size': 'B4',
-                'encoding': 'UTF-8',
-                'margin-top': '0',
-                'margin-bottom': '0',
-            }
-            pdf = pdfkit.from_string(html, False, options=options)
-            template_name = os.path.splitext(template_path)[0] + ".pdf"
+def start_pdf_job(template_paths, context):
+    """
+    Generate the ZIP archive of PDF files in a background thread.
+
+    The job state is kept in the cache under the returned id: the pending state and its
+    deadline while the job is queued or running, `PDF_JOB_FAILED` if generation raised,
+    and the archive bytes once it is ready. The cache must be shared between
+    workers (Redis) for any worker to answer `get_pdf_job`.
+
+    At most `PDF_JOB_QUEUE_SIZE` jobs are queued or running per process; beyond that no
+    job is started and the caller should render the archive itself.
+
+    Args:
+        template_paths (list): List of file paths that contain HTML templates.
+        context (dict): Dictionary containing context data for rendering the templates.
+
+    Returns:
+        str: The job id, or None if the queue is full.
+    """
+    if not _pdf_job_slots.acquire(blocking=False):
+        return None
+    try:
+        job_id = uuid.uuid4().hex
+        # A queued job may wait behind a full queue before its own deadline starts.
+        _set_pdf_job_pending(job_id, PDF_JOB_QUEUE_DEADLINE)
+        _pdf_executor.submit(_run_pdf_job, job_id, template_paths, context)
+    except Exception:
+        _pdf_job_slots.release()
+        raise
+    return job_id
+
+
+def get_pdf_job(job_id):
+    """
+    Return the state of a background PDF job.
+
+    A job still pending past its deadline (`PDF_JOB_DEADLINE` seconds after it started
+    running, or `PDF_JOB_QUEUE_DEADLINE` after it was queued) is reported as failed: its
+    worker was most likely killed or recycled and will never store a result.
+
+    Args:
+        job_id (str): The id returned by `start_pdf_job`.
+
+    Returns:
+        `PDF_JOB_PENDING`, `PDF_JOB_FAILED`, the archive bytes, or None if the job is
+        unknown or expired.
+    """
+    result = cache.get(_pdf_job_key(job_id))
+    if isinstance(result, tuple):
+        state, deadline = result
+        if time.time() > deadline:
+            return PDF_JOB_FAILED
+        return state
+    return result
+
+
+def _set_pdf_job_pending(job_id, deadline):
+    cache.set(_pdf_job_key(job_id), (PDF_JOB_PENDING, time.time() + deadline), PDF_JOB_TIMEOUT)
 
-            with open(os.path.join(temp_dir, template_name), "wb") as f:
-                f.write(pdf)
 
-        with zip_file as zip_file:
-            for root, _, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    zip_file.write(file_path, f"{file}")
+def _run_pdf_job(job_id, template_paths, context):
+    _set_pdf_job_pending(job_id, PDF_JOB_DEADLINE)
+    try:
+        result = get_cached_pdfs(template_paths, context).read()
+    except Exception:
+        logger.exception('Error al generar los pdf del trabajo %s', job_id)
+        result = PDF_JOB_FAILED
+    finally:
+        connection.close()
+        _pdf_job_slots.release()
+    cache.set(_pdf_job_key(job_id), result, PDF_JOB_TIMEOUT)
 
-    with open(zip_name, 'rb') as f:
-        response = HttpResponse(f.read(), content_type='application/zip')
-        response['Content-Disposition'] = f'attachment; filename={zip_name}'
 
-    os.remove(zip_name)
+def _pdf_job_key(job_id):
+    return f'user_documents:pdf_job:{job_id}'
 
-    return response
+
+def zip_response(archive):
+    return FileResponse(archive, as_attachment=True, filename=ZIP_NAME, content_type='application/zip')
 
 
 def get_queryset(query, model):
@@ -75,46 +243,109 @@ def get_queryset(query, model):
         QuerySet: A QuerySet of filtered objects that match the query.
 
     """
-    keywords = query.split()
-    keywords = [p.rstrip(".,") for p in keywords]
+    keywords = dict.fromkeys(p.rstrip(".,") for p in query.split())
+    years, months, days = set(), set(), set()
     filters = []
-    filters_list = [
-        ('name__icontains', 'string'),
-        ('cc__icontains', 'string'),
-        ('patientrecord__date__year', 'year'),
-        ('patientrecord__date__month', 'month'),
-        ('patientrecord__date__day', 'day')
-    ]
-    MONTHS = [('Jan', 'January', 'jan'), ('Feb', 'February', 'feb'), ('Mar', 'March', 'mar'), ('Apr', 'April', 'apr'), ('May', 'May', 'may'), ('Jun', 'June', 'jun'),
-              ('Jul', 'July', 'jul'), ('Aug', 'August', 'aug'), ('Sep', 'Sept', 'September', 'sep', 'sept'), ('Oct', 'October', 'oct'), ('Nov', 'November', 'nov'), ('Dec', 'December', 'dec')]
     for word in keywords:
-        for field, field_type in filters_list:
-            try:
-                if field_type == 'year':
-                    value = datetime.strptime(word, '%Y').year
-                elif field_type == 'month':
-                    for i, months in enumerate(MONTHS):
-                        if word in months:
-                            value = i+1
-                            break
-                    if not isinstance(value, int) or value > 12:
-                        value = datetime.strptime(word, '%m').month
-                elif field_type == 'day':
-                    value = datetime.strptime(word, '%d').day
-                elif field_type == 'string':
-                    value = word
-                else:
-                    continue
-            except:
-                continue
-            filters.append(Q(**{field: value}))
-    consultation = Q()
-    for filter in filters:
-        consultation |= filter
-    object_list = model.objects.filter(consultation).distinct()
+        filters.extend(Q(**{field: word}) for field in STRING_FILTERS)
+        month = MONTH_MAP.get(word.lower())
+        if month:
+            months.add(month)
+        elif word.isdecimal():
+            value = int(word)
+            if 1900 <= value <= 2100:
+                years.add(value)
+            elif len(word) <= 2:
+                if 1 <= value <= 12:
+                    months.add(value)
+                if 1 <= value <= 31:
+                    days.add(value)
+    date_filters = [Q(**{field: sorted(values)})
+                    for field, values in ((YEAR_FILTER, years), (MONTH_FILTER, months), (DAY_FILTER, days)) if values]
+    consultation = reduce(operator.or_, filters + date_filters, Q())
+    object_list = model.objects.filter(consultation)
+    # Only the patientrecord lookups join rows that can duplicate patients.
+    if date_filters:
+        object_list = object_list.distinct()
     return object_list
 
 
+def get_cached_queryset(query, model, timeout=SEARCH_CACHE_TIMEOUT):
+    """
+    Filter a queryset using a search query, caching the matching primary keys.
+
+    The primary keys returned by `get_queryset` are stored for `timeout` seconds, so
+    repeated searches and pagination clicks skip the LIKE scan. Empty queries are not
+    cached because they match every object, and nothing is cached without
+    `DOCUMENTS_CACHING`.
+
+    Args:
+        query (str): The search query as a text string.
+        model (Model): The Django model in which to search for objects.
+        timeout (int, optional): Seconds to keep the cached result. Default, 60.
+
+    Returns:
+        QuerySet: A QuerySet of the objects that match the query.
+    """
+    if not settings.DOCUMENTS_CACHING or not query.strip():
+        return get_queryset(query, model)
+    key = _search_cache_key('search', query, model)
+    version = get_cache_version()
+    ids = cache.get(key, version=version)
+    if ids is None:
+        ids = list(get_queryset(query, model).values_list('pk', flat=True))
+        cache.set(key, ids, timeout, version=version)
+    return model.objects.filter(pk__in=ids)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that caches the number of objects matching a search query.
+
+    The count is kept for `timeout` seconds under the same cache version as the search
+    results, so page loads skip the COUNT(*) until one of the models is saved. Without
+    `DOCUMENTS_CACHING` it counts like `Paginator`.
+
+    Args:
+        object_list (QuerySet): The objects to paginate.
+        per_page (int): The number of objects per page.
+        query (str): The search query the objects were filtered with.
+        timeout (int, optional): Seconds to keep the cached count. Default, 60.
+    """
+
+    def __init__(self, object_list, per_page, query, timeout=SEARCH_CACHE_TIMEOUT, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = _search_cache_key('count', query, object_list.model)
+        self.timeout = timeout
+
+    @cached_property
+    def count(self):
+        if not settings.DOCUMENTS_CACHING:
+            return self.object_list.count()
+        version = get_cache_version()
+        count = cache.get(self.cache_key, version=version)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(self.cache_key, count, self.timeout, version=version)
+        return count
+
+
+def _search_cache_key(prefix, query, model):
+    digest = hashlib.sha1(query.encode()).hexdigest()
+    return f'user_documents:{prefix}:{model._meta.label_lower}:{digest}'
+
+
+def get_cache_version():
+    return cache.get_or_set(CACHE_VERSION_KEY, 1, None)
+
+
+def invalidate_cache():
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 1, None)
+
+
 def migrate_csv(folder_path: str, model: Type[Model], field_mapping: Dict[str, str], delimiter: str = ';', encoding: str = 'latin-1') -> None:
     """
         Moves data from a set of CSV files to a database using the specified model.
@@ -132,27 +363,52 @@ def migrate_csv(folder_path: str, model: Type[Model], field_mapping: Dict[str, s
         Returns:
             None: This function does not return anything. Saves the migrated data to the database using the specified model.
     """
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
-        try:
-            data = pd.read_csv(file_path, sep=delimiter,
-                               encoding=encoding).dropna(how='all')
-            instances = []
-            for _, row in data.iterrows():
-                instance = model()
-                for attribute_name, field_name in field_mapping.items():
-                    value = row[field_name]
-                    if not pd.isna(value):
-                        if attribute_name == 'invoice_number':
-                            value = int(value)
-                        elif attribute_name == 'value':
-                            value = value.replace(',', '')
-                        setattr(instance, attribute_name, value)
-                instances.append(instance)
-            model.objects.bulk_create(instances)
-        except Exception as e:
-            print(f'Error al migrar el archivo {file_name}: {str(e)}')
-            raise
+    with transaction.atomic():
+        for file_name in os.listdir(folder_path):
+            file_path = os.path.join(folder_path, file_name)
+            try:
+                data = pd.read_csv(file_path, sep=delimiter,
+                                   encoding=encoding).dropna(how='all')
+                data = data[list(field_mapping.values())].rename(
+                    columns={field_name: attribute_name for attribute_name, field_name in field_mapping.items()})
+                if 'invoice_number' in data:
+                    data['invoice_number'] = pd.to_numeric(
+                        data['invoice_number']).astype('Int64')
+                if 'supplies' in data:
+                    raw_material_model = model._meta.get_field('supplies').related_model
+                    # Match names regardless of case and spacing, so variants don't become new materials.
+                    supplies = data['supplies'].str.split().str.join(' ')
+                    raw_materials = {raw_material.raw_material_name.casefold(): raw_material
+                                     for raw_material in raw_material_model.objects.all()}
+                    missing = {}
+                    for supply in supplies.dropna().unique().tolist():
+                        missing.setdefault(supply.casefold(), supply)
+                    missing = {key: name for key, name in missing.items() if key not in raw_materials}
+                    if missing:
+                        created = raw_material_model.objects.bulk_create(
+                            raw_material_model(raw_material_name=name) for name in missing.values())
+                        raw_materials.update(zip(missing, created))
+                        logger.warning('Materias primas creadas al migrar %s: %s',
+                                       file_name, ', '.join(missing.values()))
+                    data['supplies'] = supplies.str.casefold().map(raw_materials)
+                    # Rows without a supply can't be linked to a raw material; line numbers count the header.
+                    without_supplies = data['supplies'].isna()
+                    if without_supplies.any():
+                        logger.warning('Filas sin %s omitidas al migrar %s: %s', field_mapping['supplies'], file_name,
+                                       ', '.join(str(row + 2) for row in data.index[without_supplies]))
+                        data = data[~without_supplies]
+                if 'value' in data and pd.api.types.is_string_dtype(data['value']):
+                    data['value'] = data['value'].str.replace(',', '', regex=False)
+                instances = [
+                    model(**{attribute_name: value for attribute_name, value in record.items() if not pd.isna(value)})
+                    for record in data.to_dict(orient='records')
+                ]
+                model.objects.bulk_create(instances, batch_size=1000)
+            except Exception as e:
+                print(f'Error al migrar el archivo {file_name}: {str(e)}')
+                raise
+        # bulk_create sends no post_save, so the cached searches are dropped here.
+        transaction.on_commit(invalidate_cache)
 
 
 def get_materials(request, patient, model):
@@ -172,29 +428,32 @@ def get_materials(request, patient, model):
     Returns:
         materials: List of objects in the specified model that represent the materials to be supplied to the patient.
     """
-    raw_materials = patient.product_name.raw_materials.all()
+    # traceability.html looks up each material's quantity on the product.
+    prefetch_related_objects([patient.product_name], 'rawmaterialquantity_set')
+    raw_materials = list(patient.product_name.raw_materials.all())
     date = patient.patientrecord_set.latest('date').date
     materials = []
 
+    latest = model.objects.filter(supplies=OuterRef('supplies'), purchase_date__lt=date).order_by(
+        '-purchase_date').values('pk')[:1]
+    by_supply = {material.supplies_id: material for material in model.objects.filter(
+        supplies__in=raw_materials, pk=Subquery(latest)).select_related('supplies')}
+
     for raw_material in raw_materials:
-        try:
-            material = model.objects.filter(supplies=raw_material, purchase_date__lt=date).order_by(
-                '-purchase_date').latest('purchase_date')
-            materials.append(material)
-        except model.DoesNotExist:
+        material = by_supply.get(raw_material.pk)
+        if material is None:
             messages.error(
                 request, f'No se encontró ninguna fecha previa para el producto {raw_material}.')
+        else:
+            materials.append(material)
 
     return materials
 
 
-def query_msaccess(database_path, query):
-    conn_str = (
-        r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};"
-        f"DBQ={database_path};"
-    )
-    conn = pyodbc.connect(conn_str)
-    conn.setdecoding(pyodbc.SQL_WCHAR, encoding='latin-1')
+def query_msaccess(database_path, query, chunksize=None):
+    if chunksize:
+        return _read_sql_chunks(database_path, query, chunksize)
+    conn = _connect_msaccess(database_path)
     df = pd.read_sql(query, conn)
     # cursor = conn.cursor()
     # cursor.execute(query)
@@ -205,33 +464,67 @@ def query_msaccess(database_path, query):
     return df
 
 
-def migrate_msaccess(database_path, query, patient_model, product_model, field_mapping):
-    data = query_msaccess(database_path, query)
-    instances = []
-    for _, row in data.iterrows():
-        product_name = row[field_mapping['product_name']]
-        product_instance = product_model.objects.get(product_name=product_name)
-        patient_instance = patient_model()
-        for attribute_name, field_name in field_mapping.items():
-            if not attribute_name == 'product_name':
-                value = row[field_name]
-                setattr(patient_instance, attribute_name, value)
-        patient_instance.product_name = product_instance
-        instances.append(patient_instance)
-    patient_model.objects.bulk_create(instances)
+def _connect_msaccess(database_path):
+    conn_str = (
+        r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};"
+        f"DBQ={database_path};"
+    )
+    conn = pyodbc.connect(conn_str)
+    conn.setdecoding(pyodbc.SQL_WCHAR, encoding='latin-1')
+    return conn
+
+
+def _read_sql_chunks(database_path, query, chunksize):
+    # Connect on the first iteration, so a generator that is never iterated leaks nothing.
+    conn = _connect_msaccess(database_path)
+    try:
+        yield from pd.read_sql(query, conn, chunksize=chunksize)
+    finally:
+        conn.close()
+
+
+def migrate_msaccess(database_path, query, patient_model, product_model, field_mapping, chunksize=5000):
+    product_map = {}
+    with transaction.atomic():
+        for data in query_msaccess(database_path, query, chunksize=chunksize):
+            product_names = [name for name in data[field_mapping['product_name']].dropna().unique().tolist()
+                             if name not in product_map]
+            product_map.update({product.product_name: product for product in product_model.objects.filter(
+                product_name__in=product_names)})
+            instances = []
+            for row in data.to_dict(orient='records'):
+                product_name = row[field_mapping['product_name']]
+                product_instance = product_map.get(product_name)
+                if product_instance is None:
+                    logger.warning('No se encontró el producto %s, se omite el paciente.', product_name)
+                    continue
+                patient_instance = patient_model()
+                for attribute_name, field_name in field_mapping.items():
+                    if not attribute_name == 'product_name':
+                        value = row[field_name]
+                        setattr(patient_instance, attribute_name, value)
+                patient_instance.product_name = product_instance
+                instances.append(patient_instance)
+            patient_model.objects.bulk_create(instances, batch_size=500)
+        # bulk_create sends no post_save, so the cached searches are dropped here.
+        transaction.on_commit(invalidate_cache)
 
 
 def migrate_excel(file_path, sheet_name, patient_model):
     df = pd.read_excel(file_path, sheet_name=sheet_name)
-    df_left = df.iloc[:, :7]
-    df_right = df.iloc[:, 9:]
-    df_left['Unnamed: 2'].replace(['PACIENTE', 'FESTIVO'], inplace=True)
-    df_left.dropna(subset=['Unnamed: 2'], inplace=True)
-    df_right['Unnamed: 10'].replace(['PACIENTE', 'FESTIVO'], inplace=True)
-    df_right.dropna(subset=['Unnamed: 10'], inplace=True)
+    placeholders = {'PACIENTE': pd.NA, 'FESTIVO': pd.NA}
+    left_cols = df.columns[:7].tolist()
+    right_cols = df.columns[9:].tolist()
+    df_left = df.loc[:, left_cols].assign(
+        **{'Unnamed: 2': df['Unnamed: 2'].replace(placeholders)}).dropna(subset=['Unnamed: 2'])
+    df_right = df.loc[:, right_cols].assign(
+        **{'Unnamed: 10': df['Unnamed: 10'].replace(placeholders)}).dropna(subset=['Unnamed: 10'])
     patient_names = df_left["Unnamed: 2"]
-    for patient_name in patient_names:
-        patient = patient_model.objects.filter(name__icontains=patient_name)
+    names = [str(name) for name in patient_names.dropna().unique().tolist()]
+    patients = list(patient_model.objects.filter(
+        reduce(operator.or_, (Q(name__icontains=name) for name in names)))) if names else []
+    for patient_name in names:
+        patient = [p for p in patients if patient_name.lower() in p.name.lower()]
         print(patient)
     # print(patient_names)
     # patient = patient_model.objects.filter(name=patient_name)
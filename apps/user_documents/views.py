@@ -12,17 +12,31 @@ Methods:
 
 Usage:
     The view is associated with the 'index' URL pattern in the website's URLs file. When a user accesses this URL, the view searches for patients whose names match the search criteria provided in the 'q' parameter of the GET request. The search results are displayed in a table on the index page, along with links to view more detailed information about each patient.
-    If the user clicks on the "Generar pdf" button on the page, the view generates a PDF document that includes additional information about the selected patient(s), such as traceability data for the raw materials used in their products, or a detailed record of their medical history. The PDF document is created by combining multiple HTML templates (defined in separate files) using the `download_pdfs` utility function, and then returning the resulting PDF file to the user's browser.
+    If the user clicks on the "Generar pdf" button on the page, the view generates a PDF document that includes additional information about the selected patient(s), such as traceability data for the raw materials used in their products, or a detailed record of their medical history. The PDF document is created by combining multiple HTML templates (defined in separate files) using the `download_cached_pdfs` utility function, which reuses a cached archive when the same records were requested recently, and then returning the resulting ZIP file to the user's browser. When background rendering is enabled, the archive is generated by `start_pdf_job` instead and the user is redirected to the `PdfJobView`, which returns it once it is ready.
     The view also stores the search criteria in the user's session, so that it can be retrieved and used again if the user navigates away from the index page and then returns to it later.
 """
 
 
-from .models import Patient, Traceability
-from .utils import download_pdfs, get_queryset, get_materials
+import io
+
+from .models import Patient, PatientRecord, Traceability
+from .utils import (PDF_JOB_FAILED, PDF_JOB_PENDING, CachedCountPaginator, download_cached_pdfs, get_cached_queryset,
+                    get_materials, get_pdf_job, start_pdf_job, zip_response)
+from django.conf import settings
+from django.db.models import Prefetch
+from django.shortcuts import redirect
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
 from django.views.generic import TemplateView
-from django.core.paginator import Paginator
+
+NON_PATIENT_KEYS = {"page", "q", "action"}
+DOCUMENT_FLAGS = {"follow_up", "traceability"}
+PDF_CONTEXT_KEYS = ("request", "selected_patient", "follow_up", "traceability", "materials", "indices", "prothesis")
 
 
+# The page depends on the session's search and on data that can change at any time, so
+# browsers keep it but revalidate it; ConditionalGetMiddleware answers 304 if unchanged.
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
 class IndexPageView(TemplateView):
     template_name = 'index.html'
 
@@ -48,7 +62,7 @@ class IndexPageView(TemplateView):
             - 'follow-up': a boolean indicating whether the 'follow-up' checkbox was checked.
             - 'traceability': a boolean indicating whether the 'traceability' checkbox was checked.
             - 'materials': a list of Traceability objects associated with the selected Patient, if traceability is checked.
-            - 'indices': a list of integers representing the indices of the selected records, if any.
+            - 'indices': a set of integers representing the indices of the selected records, if any.
 
             If no search query is provided, the method returns an empty list of Patient objects.
 
@@ -63,42 +77,71 @@ class IndexPageView(TemplateView):
 
         if "q" in request.GET:
             query = request.GET["q"]
-            request.session['q'] = query
+            if request.session.get('q') != query:
+                request.session['q'] = query
         elif request.GET:
             query = request.session.get('q', '')
         else:
             query = ""
 
-        patient_list = get_queryset(query, Patient)
+        # The search table only shows the name, the CC and the record dates.
+        patient_list = get_cached_queryset(query, Patient).only(
+            "id", "name", "cc").prefetch_related(Prefetch(
+                "patientrecord_set",
+                queryset=PatientRecord.objects.only("id", "patient_id", "date")))
         context["patient_list"] = patient_list
 
         # Pagination
-        paginator = Paginator(patient_list, 25)
+        paginator = CachedCountPaginator(patient_list, 25, query)
         page_number = request.GET.get("page", 1)
         page_obj = paginator.get_page(page_number)
         context["page_obj"] = page_obj
         context["paginator"] = paginator
 
-        if request.GET:
-            first_key = list(request.GET.keys())[0]
-            selected_patient = patient_list.filter(name=first_key)
-
-            if selected_patient.exists():
-                patient_name = first_key
-                parameters = request.GET.getlist(patient_name)
-                patient = selected_patient.first()
-                context["selected_patient"] = patient
+        context.update(self.get_document_context_data())
+        return context
 
-                if "follow_up" in parameters:
-                    context["follow_up"] = parameters.pop(-2)
+    def get_document_context_data(self):
+        """
+        Generates the context data for the selected patient's documents.
 
-                if "traceability" in parameters:
-                    context["traceability"] = parameters.pop(-2)
+        Returns:
+            A dictionary with the 'request', 'selected_patient', 'follow_up', 'traceability', 'materials', 'indices' and 'prothesis' keys, as far as they apply. It is empty apart from 'request' if no patient is selected.
 
-                    context["materials"] = get_materials(
+        Description:
+            This is all the context the PDF templates read, so the PDF download builds it on its own, without running the patient search or the pagination.
+        """
+        request = self.request
+        document_context = {"request": request}
+
+        # Pagination, search and button keys never name a patient.
+        first_key = next(
+            (key for key in request.GET if key not in NON_PATIENT_KEYS), None)
+        if first_key is not None:
+            patient = Patient.objects.filter(
+                name=first_key).select_related('product_name').first()
+
+            if patient is not None:
+                document_context["selected_patient"] = patient
+
+                # Record checkboxes send their index, the others their name.
+                flags = set()
+                indices = set()
+                for value in request.GET.getlist(first_key):
+                    if value.isdecimal():
+                        indices.add(int(value))
+                    elif value in DOCUMENT_FLAGS:
+                        flags.add(value)
+
+                document_context["follow_up"] = "follow_up" in flags
+                document_context["traceability"] = "traceability" in flags
+
+                if document_context["traceability"]:
+                    document_context["materials"] = get_materials(
                         request, patient, Traceability)
 
-                context["indices"] = list(map(int, parameters[:-1]))
+                # patient_record.html checks each record against the indices with `in`.
+                document_context["indices"] = frozenset(indices)
 
             # Temporary
 
@@ -110,9 +153,9 @@ class IndexPageView(TemplateView):
                               "TRANSFEMORAL"]
 
                 if patient.product_name.product_name in prosthesis:
-                    context["prothesis"] = True
+                    document_context["prothesis"] = True
 
-        return context
+        return document_context
 
     def get(self, request, *args, **kwargs):
         """
@@ -124,18 +167,18 @@ class IndexPageView(TemplateView):
             **kwargs: optional keyword arguments.
 
         Returns:
-            A response object containing the rendered template or a PDF download, depending on the presence of the 'Generar pdf' button in the GET parameters.
+            A response object containing the rendered template or a PDF download, depending on the 'action' GET parameter.
 
         Raises:
             None.
 
         Description:
-            This method calls the 'get_context_data' method to generate the context data dictionary for the template rendering. If the 'Generar pdf' button is present in the GET parameters, the method generates a PDF file by rendering one or more HTML templates specified by the 'follow-up', 'traceability', and 'indices' keys in the context data dictionary. The resulting PDF file is returned as a download response.
+            If the 'Generar pdf' button was clicked ('action' is 'pdf'), the method calls 'get_document_context_data' and generates a PDF file by rendering one or more HTML templates specified by the 'follow-up', 'traceability', and 'indices' keys in that context. The resulting PDF file is returned as a download response.
 
-            If the 'Generar pdf' button is not present in the GET parameters, the method renders the 'index.html' template using the context data dictionary and returns the resulting response object.
+            Otherwise, the method calls the 'get_context_data' method, renders the 'index.html' template using the context data dictionary and returns the resulting response object.
         """
-        context = self.get_context_data(**kwargs)
-        if "Generar pdf" in request.GET.values():
+        if request.GET.get("action") == "pdf":
+            context = self.get_document_context_data()
             template_paths = []
             if context.get("follow_up"):
                 template_paths.append("follow-up.html")
@@ -143,6 +186,40 @@ class IndexPageView(TemplateView):
                 template_paths.append("traceability.html")
             if context.get("indices"):
                 template_paths.append("patient_record.html")
-            pdf = download_pdfs(template_paths, context)
+            # Only hand the PDF templates (and a background job) what they read.
+            pdf_context = {key: context[key] for key in PDF_CONTEXT_KEYS if key in context}
+            if settings.PDF_BACKGROUND_RENDERING:
+                job_id = start_pdf_job(template_paths, pdf_context)
+                # A full job queue falls back to rendering in this request.
+                if job_id is not None:
+                    return redirect("user_documents:pdf_job", job_id=job_id)
+            pdf = download_cached_pdfs(template_paths, pdf_context)
             return pdf
+        context = self.get_context_data(**kwargs)
         return self.render_to_response(context)
+
+
+class PdfJobView(TemplateView):
+    template_name = 'pdf_job.html'
+
+    def get(self, request, job_id, *args, **kwargs):
+        """
+        Handles GET requests for the result of a background PDF job.
+
+        Args:
+            request: the current request object.
+            job_id: the id returned by `start_pdf_job`.
+
+        Returns:
+            The ZIP file once the job has finished. While it is still running, a 202 response
+            with a 'Refresh' header so the browser asks again; a 404 if the job is unknown or
+            expired, and a 500 if it failed or ran past its deadline.
+        """
+        result = get_pdf_job(job_id)
+        if result == PDF_JOB_PENDING:
+            response = self.render_to_response({"pending": True}, status=202)
+            response["Refresh"] = "2"
+            return response
+        if result is None or result == PDF_JOB_FAILED:
+            return self.render_to_response({}, status=404 if result is None else 500)
+        return zip_response(io.BytesIO(result))